@@ -0,0 +1,28 @@
+import asyncio
+import logging
+
+from database import async_engine, Base
+import models  # noqa: F401  Registers the ORM tables on Base.metadata
+
+
+logger = logging.getLogger(__name__)
+
+
+async def create_tables():
+    """ Create all tables that do not exist yet """
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    logger.info("Database tables created")
+
+
+async def main():
+    """ One-shot schema setup, run as a deploy step before starting the Uvicorn workers """
+    try:
+        await create_tables()
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,21 +1,22 @@
 import os
 import asyncio
+import hashlib
 import logging
-import json
 from contextlib import asynccontextmanager
-from typing import List
+from typing import List, Optional, Set
 
-from fastapi import FastAPI, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse, FileResponse
+import orjson
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, status, WebSocket
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy import select
+from sqlalchemy import bindparam, insert, update, delete, text
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Session
 
-from database import get_db, get_async_db, engine, Base, ASYNC_DATABASE_URL
-from schemas import InventoryCreate, InventoryUpdate, InventoryResponse
+from database import get_async_db, async_engine, ASYNC_DATABASE_URL, NOTIFY_BACKEND, POOL_SIZE, REDIS_URL
+from init_db import create_tables
+from schemas import InventoryCreate, InventoryBulkCreate, InventoryUpdate, InventoryResponse
 from models import Inventory
-from notify import PostgresNotifier
+from notify import INVENTORY_CHANNEL, Notifier, PostgresNotifier, RedisStreamNotifier
 
 
 # Configure logging
@@ -23,45 +24,71 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Statements reused by the item handlers, built once at import instead of per request
+UPDATE_INVENTORY_QUANTITY = (
+    update(Inventory)
+    .where(Inventory.id == bindparam("item_id"))
+    .values(quantity=bindparam("new_quantity"))
+    .returning(Inventory)
+    .execution_options(synchronize_session=False)
+)
+DELETE_INVENTORY_ITEM = (
+    delete(Inventory)
+    .where(Inventory.id == bindparam("item_id"))
+    .returning(Inventory.id)
+    .execution_options(synchronize_session=False)
+)
+
+# Seconds between server pings to each websocket. These application pings surface sockets whose sends fail;
+# half-open peers that never answer are detected by the server's protocol-level ping/pong, so run with e.g.
+# `uvicorn main:app --ws-ping-interval 20 --ws-ping-timeout 20`
+WS_HEARTBEAT_INTERVAL_SECONDS = 30
+
+
 # Websocket connection manager
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.active_connections: Set[WebSocket] = set()
 
     async def connect(self, websocket: WebSocket):
-        """ This method accepts a new Websocket connection and adds it to the list of active connections."""
+        """ This method accepts a new Websocket connection and adds it to the set of active connections."""
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.active_connections.add(websocket)
         logger.info(f"Websocket connected. Total connections: {len(self.active_connections)}")
 
     def disconnect(self, websocket: WebSocket):
-        """ This method removes a Websocket connection from the active list when the client disconnects or the connection is closed """
-        self.active_connections.remove(websocket)
+        """ This method removes a Websocket connection from the active set when the client disconnects or the connection is closed.
+            It is safe to call for a connection that broadcast already pruned. """
+        if websocket not in self.active_connections:
+            return
+        self.active_connections.discard(websocket)
         logger.info(f"Websocket disconnected. Total connections: {len(self.active_connections)}")
 
-    async def broadcast(self, message: dict):
-        """ This method sends a message to all connection clients and cleans up any disconnected clients. """
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(json.dumps(message))
-            except Exception as e:
-                logger.error(f"Error sending message to Websocket: {e}")
-                disconnected.append(connection)
+    async def broadcast(self, events: List[dict]):
+        """ This method sends a batch of events to all connection clients concurrently as a single frame and cleans up any disconnected clients. """
+        # Serialize once and send the same bytes frame to every client
+        frame = orjson.dumps({"events": events})
+        connections = list(self.active_connections)
+        results = await asyncio.gather(
+            *(connection.send_bytes(frame) for connection in connections),
+            return_exceptions=True,
+        )
 
         # Remove disconnected connections
-        for connection in disconnected:
-            self.active_connections.remove(connection)
+        for connection, result in zip(connections, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error sending message to Websocket: {result}")
+                self.active_connections.discard(connection)
 
 
 # Global instances
 manager = ConnectionManager()
-notifier = None
+notifier: Optional[Notifier] = None
 
 
-async def handle_postgres_notification(data: dict):
-    """ Handle PostgreSQL notifications and broadcast to Websocket clients """
-    await manager.broadcast(data)
+async def handle_change_events(events: List[dict]):
+    """ Handle a batch of change events from the notifier and broadcast to Websocket clients """
+    await manager.broadcast(events)
 
 
 
@@ -69,36 +96,54 @@ async def handle_postgres_notification(data: dict):
 async def lifespan(app:FastAPI):
     global notifier
 
-    # Create tables
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database tables created")
+    # Schema is created by `python init_db.py` at deploy time; opt in here for local development only
+    if os.getenv("AUTO_CREATE_SCHEMA") == "1":
+        await create_tables()
+
+    # Warm up the connection pool
+    await warm_up_pool()
+    logger.info(f"Connection pool warmed up with {POOL_SIZE} connections")
 
-    # Start Postgres listener
-    notifier = PostgresNotifier(ASYNC_DATABASE_URL.replace("+asyncpg", ""))
-    notifier.add_listener(handle_postgres_notification)
+    # Start the change listener for the configured backend
+    if NOTIFY_BACKEND == "redis":
+        notifier = RedisStreamNotifier(REDIS_URL)
+    else:
+        notifier = PostgresNotifier(ASYNC_DATABASE_URL.replace("+asyncpg", ""))
+    notifier.add_listener(handle_change_events)
 
     # Start listening in background
-    task = asyncio.create_task(start_postgres_listener())
+    task = asyncio.create_task(start_change_listener())
     yield
 
-    # Shutdown
-    task.cancel()
+    # Shutdown: disconnect wakes the listener so it exits promptly; cancel covers a listener still connecting
     if notifier:
         await notifier.disconnect()
+    task.cancel()
+
 
+async def _open_pooled_connection():
+    """ Open a pooled connection and run a trivial query so it is fully established """
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
 
-async def start_postgres_listener():
-    """ Start the PostgreSQL listener"""
+
+async def warm_up_pool():
+    """ Pre-create every pooled connection so requests never pay the connect cost """
+    await asyncio.gather(*(_open_pooled_connection() for _ in range(POOL_SIZE)))
+
+
+async def start_change_listener():
+    """ Start the change notification listener"""
     try:
-        await notifier.listen_to_channel('inventory_channel')
+        await notifier.listen_to_channel(INVENTORY_CHANNEL)
         await notifier.start_listening()
     except Exception as e:
-        logger.error(f"Error in PostgreSQL listener: {e}")
+        logger.error(f"Error in change listener: {e}")
 
 
 
 # FastAPI and Static Files
-app = FastAPI(title="Real-Time Inventory tracker", lifespan=lifespan)
+app = FastAPI(title="Real-Time Inventory tracker", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -117,40 +162,84 @@ async def read_root():
     return HTMLResponse(content=html_content)
 '''
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_PATH = os.path.join(BASE_DIR, "static", "index.html")
+
+# Read the SPA shell once so the landing page is served from memory
+with open(INDEX_PATH, "rb") as f:
+    _INDEX_BYTES = f.read()
+_INDEX_ETAG = f'"{hashlib.md5(_INDEX_BYTES).hexdigest()}"'
+_INDEX_HEADERS = {"ETag": _INDEX_ETAG, "Cache-Control": "public, max-age=60"}
+
+def _etag_matches(if_none_match: Optional[str]) -> bool:
+    """ Weak comparison of an If-None-Match header against the index ETag, accepting lists, W/ tags and * """
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == _INDEX_ETAG:
+            return True
+    return False
 
 @app.get("/")
-def read_index():
-    return FileResponse(os.path.join(BASE_DIR, "static", "index.html"))
-
-@app.post("/api/inventory", response_model=InventoryResponse)
+async def read_index(request: Request):
+    if _etag_matches(request.headers.get("if-none-match")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_INDEX_HEADERS)
+    return Response(content=_INDEX_BYTES, media_type="text/html", headers=_INDEX_HEADERS)
+
+def serialize_inventory_item(db_item: Inventory) -> dict:
+    """ Build the response body straight from the ORM row, skipping response_model re-validation """
+    return {
+        "id": db_item.id,
+        "name": db_item.name,
+        "quantity": db_item.quantity,
+        "updated_at": db_item.updated_at.isoformat(),
+    }
+
+# The write endpoints return pre-serialized bodies; responses= keeps InventoryResponse in the OpenAPI schema
+@app.post("/api/inventory", responses={200: {"model": InventoryResponse}})
 async def create_inventory_item(
     item: InventoryCreate,
     db: AsyncSession = Depends(get_async_db)
 ):
     """ Create a new inventory item """
-    db_item = Inventory(**item.dict())
+    db_item = Inventory(**item.model_dump())
     db.add(db_item)
     await db.commit()
-    await db.refresh(db_item)
-    return db_item
+    return ORJSONResponse(serialize_inventory_item(db_item))
+
+@app.post("/api/inventory/bulk", response_model=List[InventoryResponse])
+async def create_inventory_items_bulk(
+    payload: InventoryBulkCreate,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """ Create many inventory items with a single INSERT ... RETURNING and one commit """
+    if not payload.items:
+        return []
+
+    # Keep RETURNING rows in input order even when insertmanyvalues splits the INSERT into batches
+    stmt = insert(Inventory).returning(Inventory, sort_by_parameter_order=True)
+    result = await db.execute(stmt, [item.model_dump() for item in payload.items])
+    db_items = result.scalars().all()
+    await db.commit()
+    return db_items
 
-@app.put("/api/inventory/{item_id}", response_model=InventoryResponse)
+@app.put("/api/inventory/{item_id}", responses={200: {"model": InventoryResponse}})
 async def update_inventory_item(
     item_id : int,
     item_update: InventoryUpdate,
     db: AsyncSession = Depends(get_async_db)
 ):
     """ Update on inventory item's quantity"""
-    result = await db.execute(select(Inventory).where(Inventory.id == item_id))
+    result = await db.execute(
+        UPDATE_INVENTORY_QUANTITY, {"item_id": item_id, "new_quantity": item_update.quantity}
+    )
     db_item = result.scalar_one_or_none()
 
     if not db_item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
-    
-    db_item.quantity = item_update.quantity
+
     await db.commit()
-    await db.refresh(db_item)
-    return db_item
+    return ORJSONResponse(serialize_inventory_item(db_item))
 
 @app.delete("/api/inventory/{item_id}")
 async def delete_inventory_item(
@@ -158,23 +247,42 @@ async def delete_inventory_item(
     db: AsyncSession = Depends(get_async_db)
 ):
     """ Delete an inventory Item"""
-    result = await db.execute(select(Inventory).where(Inventory.id == item_id))
-    db_item = result.scalar_one_or_none()
-    if not db_item:
+    result = await db.execute(DELETE_INVENTORY_ITEM, {"item_id": item_id})
+    deleted_id = result.scalar_one_or_none()
+    if deleted_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item Not Found")
-    
-    await db.delete(db_item)
+
     await db.commit()
     return {"message" : "Item deleted successfully"}
 
 
+async def send_heartbeats(websocket: WebSocket):
+    """ Ping the client periodically so dead peers are detected and pruned instead of lingering in the active set """
+    try:
+        while True:
+            await asyncio.sleep(WS_HEARTBEAT_INTERVAL_SECONDS)
+            await websocket.send_json({"t": "ping"})
+    except Exception as e:
+        logger.info(f"Websocket heartbeat failed: {e}")
+        manager.disconnect(websocket)
+        try:
+            await websocket.close()
+        except Exception:
+            # The transport is already gone; nothing left to close
+            pass
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """ Websocket endpoint for real-time updates"""
     await manager.connect(websocket)
+    heartbeat = asyncio.create_task(send_heartbeats(websocket))
     try:
+        # Client messages are ignored; receive() accepts both text and binary frames
         while True:
-            # Keep connection alive
-            await websocket.receive_text()
-    except Exception as e:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+    finally:
+        heartbeat.cancel()
         manager.disconnect(websocket)
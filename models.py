@@ -6,6 +6,8 @@ from database import Base
 
 class Inventory(Base):
     __tablename__ = "inventory"
+    # Fetch server-generated id/updated_at via INSERT ... RETURNING instead of a follow-up SELECT
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
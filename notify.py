@@ -1,70 +1,344 @@
 import asyncio
-import json
 import logging
-from typing import Callable
+from typing import Callable, Dict, List, Optional, Protocol, Set
 
 import asyncpg
+import orjson
 
 
 logger = logging.getLogger(__name__)
 
+# Channel the inventory trigger publishes to; also used as the Redis stream key
+INVENTORY_CHANNEL = "inventory_channel"
+
+# Errors that mean the listener connection is gone and must be re-established,
+# including a server that is restarting ("the database system is starting up") or shutting down
+RECONNECT_ERRORS = (
+    asyncpg.exceptions.ConnectionDoesNotExistError,
+    asyncpg.exceptions.InterfaceError,
+    asyncpg.exceptions.PostgresConnectionError,
+    asyncpg.exceptions.CannotConnectNowError,
+    asyncpg.exceptions.AdminShutdownError,
+    OSError,
+)
+MAX_BACKOFF_SECONDS = 30
+
+# A half-open socket never fires asyncpg's termination listener, so the idle listener is probed periodically
+LISTENER_HEALTH_CHECK_INTERVAL_SECONDS = 30
+LISTENER_HEALTH_CHECK_TIMEOUT_SECONDS = 5
+
+# Notifications arriving within this window are delivered to listeners as a single batch
+COALESCE_WINDOW_SECONDS = 0.005
+MAX_BATCH_SIZE = 64
+
+# Small pool for NOTIFY writes; asyncpg caches the prepared pg_notify statement per connection
+NOTIFY_POOL_MIN_SIZE = 1
+NOTIFY_POOL_MAX_SIZE = 4
+NOTIFY_STATEMENT_CACHE_SIZE = 256
+
+# Redis Streams backend settings
+REDIS_BLOCK_MILLISECONDS = 1000
+REDIS_STREAM_MAXLEN = 10000
+
+
+async def wait_before_reconnect(stop_event: asyncio.Event, delay: float):
+    """ Sleep before reconnecting, returning early if a stop is requested """
+    try:
+        await asyncio.wait_for(stop_event.wait(), timeout=delay)
+    except asyncio.TimeoutError:
+        pass
+
+
+class Notifier(Protocol):
+    """ Interface shared by the notification backends used to fan change events out to Websocket clients """
+
+    def add_listener(self, callback: Callable): ...
+
+    async def listen_to_channel(self, channel: str): ...
+
+    async def start_listening(self): ...
+
+    async def notify(self, channel: str, payload: str): ...
+
+    async def disconnect(self): ...
+
+
 class PostgresNotifier:
+    """ Owns a single dedicated asyncpg connection used only for LISTEN.
+        This connection is deliberately kept outside the SQLAlchemy pool: LISTEN pins its
+        connection for the lifetime of the subscription, which would starve the pool and
+        defeat transaction-mode poolers. All NOTIFY traffic goes through a separate small pool. """
+
     def __init__(self, database_url: str):
-        self.database_url = database_url 
-        self.connection = None
+        self.database_url = database_url
+        self.connection: Optional[asyncpg.Connection] = None
         self.listeners = []
+        self._channels: Set[str] = set()
+        self._connection_lost = asyncio.Event()
+        self._stop_event = asyncio.Event()
+        self._events: asyncio.Queue = asyncio.Queue()
+        self._pool: Optional[asyncpg.Pool] = None
+        self._pool_lock = asyncio.Lock()
 
     async def connect(self):
-        """ Connect to PostgreSQL """
+        """ Connect to PostgreSQL and re-subscribe to every tracked channel """
         try:
             self.connection = await asyncpg.connect(self.database_url)
+            self.connection.add_termination_listener(self._on_connection_terminated)
+            self._connection_lost.clear()
             logger.info("Connected to PostgreSQL for notifications")
         except Exception as e:
             logger.error(f"Failed to connect to PostgreSQL: {e}")
             raise
 
+        for channel in self._channels:
+            await self.connection.add_listener(channel, self._handle_notification)
+            logger.info(f"Listening to channel: {channel}")
+
     async def disconnect(self):
-        """ Disconnect from PostgreSQL """
-        if self.connection:
-            await self.connection.close()
+        """ Stop the listening loop and disconnect from PostgreSQL """
+        self._stop_event.set()
+        await self._close_connection()
+        if self._pool:
+            await self._pool.close()
+            self._pool = None
+
+    async def _close_connection(self):
+        """ Close the listener connection without stopping the listening loop """
+        if self.connection and not self.connection.is_closed():
+            try:
+                await self.connection.close(timeout=LISTENER_HEALTH_CHECK_TIMEOUT_SECONDS)
+            except Exception:
+                # A dead peer cannot acknowledge a graceful close
+                self.connection.terminate()
             logger.info("Disconnected from PostgreSQL")
 
+    async def _get_pool(self) -> asyncpg.Pool:
+        """ Lazily create the pool used for NOTIFY writes """
+        async with self._pool_lock:
+            if self._pool is None:
+                self._pool = await asyncpg.create_pool(
+                    self.database_url,
+                    min_size=NOTIFY_POOL_MIN_SIZE,
+                    max_size=NOTIFY_POOL_MAX_SIZE,
+                    statement_cache_size=NOTIFY_STATEMENT_CACHE_SIZE,
+                )
+        return self._pool
+
+    async def notify(self, channel: str, payload: str):
+        """ Send a notification on a channel through the NOTIFY pool, never through the listener connection """
+        pool = await self._get_pool()
+        async with pool.acquire() as connection:
+            await connection.execute("SELECT pg_notify($1, $2)", channel, payload)
+
     def add_listener(self, callback: Callable):
         """ Add a callback function to handle notifications """
         self.listeners.append(callback)
 
     async def listen_to_channel(self, channel: str):
-        """ Listen to a specific PostgreSQL channel """
-        if not self.connection:
-            await self.connect()
+        """ Listen to a specific PostgreSQL channel.
+            Without a live connection the channel is only recorded; start_listening connects with backoff and subscribes it. """
+        self._channels.add(channel)
+        if not self.connection or self.connection.is_closed():
+            return
 
         await self.connection.add_listener(channel, self._handle_notification)
         logger.info(f"Listening to channel: {channel}")
 
+    def _on_connection_terminated(self, connection):
+        """ Wake the listening loop when the listener connection drops """
+        logger.warning("PostgreSQL listener connection terminated")
+        self._connection_lost.set()
+
     async def _handle_notification(self, connection, pid, channel, payload):
-        """ Handle incoming notifications """
+        """ Handle incoming notifications by queueing them for the coalescer """
         try:
-            data = json.loads(payload)
+            data = orjson.loads(payload)
             logger.info(f"Received notification: {data}")
+            self._events.put_nowait(data)
+        except Exception as e:
+            logger.error(f"Error handling notification: {e}")
+
+    def _drain_events(self, batch: list):
+        """ Move already-queued events into the batch without waiting, up to MAX_BATCH_SIZE """
+        while len(batch) < MAX_BATCH_SIZE:
+            try:
+                batch.append(self._events.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+    async def _run_coalescer(self):
+        """ Collect bursts of notifications and hand each burst to the listeners as one list """
+        while True:
+            batch = [await self._events.get()]
+            self._drain_events(batch)
+            if len(batch) < MAX_BATCH_SIZE:
+                # Give stragglers from the same burst a moment to arrive
+                await asyncio.sleep(COALESCE_WINDOW_SECONDS)
+                self._drain_events(batch)
 
             # Notify all registered listeners
             for listener in self.listeners:
-                await listener(data)
-        except Exception as e:
-            logger.error(f"Error handling notification: {e}")
+                try:
+                    await listener(batch)
+                except Exception as e:
+                    logger.error(f"Error in notification listener: {e}")
 
-    async def start_listening(self):
-        """ Start the listening loop """
-        if not self.connection:
-            await self.connect()
+    async def _check_connection(self):
+        """ Run a cheap query on the listener connection, treating a timeout as a lost connection """
+        try:
+            await asyncio.wait_for(
+                self.connection.execute("SELECT 1"), timeout=LISTENER_HEALTH_CHECK_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            raise asyncpg.exceptions.ConnectionDoesNotExistError("listener health check timed out")
 
+    async def _wait_for_stop_or_connection_loss(self):
+        """ Park until a stop is requested or the listener connection is lost.
+            asyncpg dispatches notifications from its own reader, so the only wakeups are the periodic health checks. """
+        while True:
+            waiters = [
+                asyncio.create_task(self._stop_event.wait()),
+                asyncio.create_task(self._connection_lost.wait()),
+            ]
+            try:
+                await asyncio.wait(
+                    waiters, timeout=LISTENER_HEALTH_CHECK_INTERVAL_SECONDS, return_when=asyncio.FIRST_COMPLETED
+                )
+            finally:
+                for waiter in waiters:
+                    waiter.cancel()
+
+            if self._stop_event.is_set():
+                return
+            if self._connection_lost.is_set():
+                raise asyncpg.exceptions.ConnectionDoesNotExistError("listener connection was lost")
+            await self._check_connection()
+
+    async def start_listening(self):
+        """ Start the listening loop, reconnecting with exponential backoff if the connection drops """
+        attempt = 0
+        coalescer = asyncio.create_task(self._run_coalescer())
         try:
-            while True:
-                await asyncio.sleep(0.1) # Kepp the connection alive
+            while not self._stop_event.is_set():
+                try:
+                    if not self.connection or self.connection.is_closed():
+                        await self.connect()
+                    attempt = 0
+                    await self._wait_for_stop_or_connection_loss()
+                except RECONNECT_ERRORS as e:
+                    delay = min(MAX_BACKOFF_SECONDS, 2 ** attempt)
+                    attempt += 1
+                    logger.warning(f"PostgreSQL listener connection error: {e}. Reconnecting in {delay}s")
+                    await self._close_connection()
+                    await wait_before_reconnect(self._stop_event, delay)
         except asyncio.CancelledError:
             logger.info("Listening cancelled")
         except Exception as e:
             logger.error(f"Error in listening loop: {e}")
         finally:
-            await self.disconnect()
-            
+            coalescer.cancel()
+            await self._close_connection()
+
+
+class RedisStreamNotifier:
+    """ Reads change events from Redis Streams so workers need no Postgres LISTEN connection of their own.
+        Every worker reads each stream with plain XREAD from the tail, so all workers see every event
+        (a consumer group would split events between workers instead of fanning them out).
+        Events get onto the stream through notify(), e.g. from relay.py bridging Postgres NOTIFY. """
+
+    def __init__(self, redis_url: str):
+        # Redis is an optional backend, so the package is only required when this notifier is used
+        import redis.asyncio as redis
+
+        self.redis_url = redis_url
+        self.client = redis.from_url(redis_url)
+        self._reconnect_errors = (redis.ConnectionError, redis.TimeoutError, OSError)
+        self.listeners = []
+        # Last entry id read per stream; None until the stream tail has been resolved
+        self._last_ids: Dict[str, Optional[str]] = {}
+        self._stop_event = asyncio.Event()
+
+    async def disconnect(self):
+        """ Stop the listening loop and disconnect from Redis """
+        self._stop_event.set()
+        await self.client.aclose()
+        logger.info("Disconnected from Redis")
+
+    def add_listener(self, callback: Callable):
+        """ Add a callback function to handle notifications """
+        self.listeners.append(callback)
+
+    async def listen_to_channel(self, channel: str):
+        """ Listen to a specific Redis stream; start_listening resolves where reading begins """
+        self._last_ids.setdefault(channel, None)
+        logger.info(f"Listening to stream: {channel}")
+
+    async def _resolve_stream_tails(self):
+        """ Record the current tail of each new stream so reading starts with events added after subscribing.
+            Re-sending "$" on every XREAD would instead drop events added between reads. """
+        for channel, last_id in self._last_ids.items():
+            if last_id is None:
+                latest = await self.client.xrevrange(channel, count=1)
+                self._last_ids[channel] = latest[0][0].decode() if latest else "0-0"
+
+    async def notify(self, channel: str, payload: str):
+        """ Append an event to a Redis stream, trimming old entries """
+        await self.client.xadd(channel, {"payload": payload}, maxlen=REDIS_STREAM_MAXLEN, approximate=True)
+
+    async def notify_many(self, channel: str, payloads: List[str]):
+        """ Append a batch of events to a Redis stream in a single round trip """
+        async with self.client.pipeline(transaction=False) as pipe:
+            for payload in payloads:
+                pipe.xadd(channel, {"payload": payload}, maxlen=REDIS_STREAM_MAXLEN, approximate=True)
+            await pipe.execute()
+
+    async def _read_batch(self) -> List[dict]:
+        """ Block briefly for new stream entries and decode them in arrival order """
+        response = await self.client.xread(
+            self._last_ids, count=MAX_BATCH_SIZE, block=REDIS_BLOCK_MILLISECONDS
+        )
+        batch = []
+        for stream, entries in response:
+            channel = stream.decode()
+            for entry_id, fields in entries:
+                # Advance past every entry, including malformed ones, so a bad entry is never re-read
+                self._last_ids[channel] = entry_id.decode()
+                try:
+                    batch.append(orjson.loads(fields[b"payload"]))
+                except (KeyError, orjson.JSONDecodeError) as e:
+                    logger.error(f"Skipping malformed stream entry {entry_id!r} on {channel}: {e!r}")
+        return batch
+
+    async def start_listening(self):
+        """ Start the listening loop, reconnecting with exponential backoff if Redis is unavailable """
+        attempt = 0
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    await self._resolve_stream_tails()
+                    batch = await self._read_batch()
+                    attempt = 0
+                except self._reconnect_errors as e:
+                    if self._stop_event.is_set():
+                        break
+                    delay = min(MAX_BACKOFF_SECONDS, 2 ** attempt)
+                    attempt += 1
+                    logger.warning(f"Redis listener connection error: {e}. Reconnecting in {delay}s")
+                    await wait_before_reconnect(self._stop_event, delay)
+                    continue
+
+                if not batch:
+                    continue
+                logger.info(f"Received {len(batch)} stream events")
+
+                # Notify all registered listeners
+                for listener in self.listeners:
+                    try:
+                        await listener(batch)
+                    except Exception as e:
+                        logger.error(f"Error in notification listener: {e}")
+        except asyncio.CancelledError:
+            logger.info("Listening cancelled")
+        except Exception as e:
+            logger.error(f"Error in listening loop: {e}")
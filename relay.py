@@ -0,0 +1,34 @@
+import asyncio
+import logging
+from typing import List
+
+import orjson
+
+from database import ASYNC_DATABASE_URL, REDIS_URL
+from notify import INVENTORY_CHANNEL, PostgresNotifier, RedisStreamNotifier
+
+
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    """ Bridge Postgres NOTIFY into Redis Streams with a single LISTEN connection.
+        Run one relay per deployment when the API workers use NOTIFY_BACKEND=redis. """
+    publisher = RedisStreamNotifier(REDIS_URL)
+    listener = PostgresNotifier(ASYNC_DATABASE_URL.replace("+asyncpg", ""))
+
+    async def forward(events: List[dict]):
+        await publisher.notify_many(INVENTORY_CHANNEL, [orjson.dumps(event).decode() for event in events])
+
+    listener.add_listener(forward)
+    try:
+        await listener.listen_to_channel(INVENTORY_CHANNEL)
+        await listener.start_listening()
+    finally:
+        await listener.disconnect()
+        await publisher.disconnect()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,5 +1,9 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
+from typing import List
+
+# Upper bound on items per bulk request so a single request cannot build an unbounded INSERT
+MAX_BULK_ITEMS = 1000
 
 class InventoryBase(BaseModel):
     """ The InventoryBase schema aerves as the parent for our API validation. 
@@ -12,6 +16,11 @@ class InventoryCreate(InventoryBase):
         This will be used in the route for creating a new inventory item. """
     pass
 
+class InventoryBulkCreate(BaseModel):
+    """ The InventoryBulkCreate schema wraps a list of InventoryCreate items.
+        This will be used in the route for creating many inventory items in a single request. """
+    items : List[InventoryCreate] = Field(max_length=MAX_BULK_ITEMS)
+
 class InventoryUpdate(BaseModel):
     """ The InventoryUpdate schema is a standalone schema. It has a non-nullable field quantity,
         including that only the quantity field of the inventory item can be updated."""
@@ -20,11 +29,10 @@ class InventoryUpdate(BaseModel):
 
 class InventoryResponse(InventoryBase):
     """ The InventoryResponse schema represents how the inventory data is rendered from the database to the user.
-      It is a child schema of the InventoryBase schema. The Config class with the from_attributes = True 
+      It is a child schema of the InventoryBase schema. The model_config with from_attributes = True 
       allows pydantic work seamlessly with SQLAlchemy models."""
+    model_config = ConfigDict(from_attributes=True)
+
     id : int
     updated_at : datetime
 
-    class config:
-        from_attributes = True
-
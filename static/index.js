@@ -19,13 +19,20 @@ class InventoryApp {
     const protocol = window.location.protocol === "https:" ? "wss:" : "ws:";
     const wsUrl = `${protocol}//${window.location.host}/ws`;
     this.websocket = new WebSocket(wsUrl);
+    this.websocket.binaryType = "arraybuffer";
+    this.textDecoder = new TextDecoder();
     this.websocket.onopen = () => {
       this.updateConnectionStatus(true);
     };
     this.websocket.onmessage = (event) => {
       try {
-        const data = JSON.parse(event.data);
-        this.handleWebSocketMessage(data);
+        const text =
+          typeof event.data === "string"
+            ? event.data
+            : this.textDecoder.decode(event.data);
+        // Heartbeat pings carry no events
+        const { events = [] } = JSON.parse(text);
+        events.forEach((data) => this.handleWebSocketMessage(data));
       } catch (error) {
         console.error("Error parsing WebSocket message:", error);
       }